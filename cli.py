@@ -3,25 +3,29 @@ import asyncio
 import sys
 import os
 import json
+import re
 import time
-import threading
-import subprocess
-from typing import Optional, List, Dict, Any
-from contextlib import AsyncExitStack
+from collections import deque
+from functools import lru_cache
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Optional, List, Any, Mapping
+from contextlib import AsyncExitStack, asynccontextmanager
 from pathlib import Path
 
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fall back to the stdlib parser
+    orjson = None
 
 from dotenv import load_dotenv
-import google.generativeai as genai
 from rich.console import Console
-from rich.markdown import Markdown
-from rich import print as rprint
 from rich.panel import Panel
 from rich.prompt import Prompt
-from rich.spinner import Spinner
-from rich.live import Live
+
+# Heavy dependencies (google.generativeai, mcp, rich's Markdown, Live and
+# Spinner) are imported on first use so that startup only pays for what it needs
+if TYPE_CHECKING:
+    from mcp import ClientSession
 
 # Load environment variables from .env file
 load_dotenv()
@@ -29,6 +33,124 @@ load_dotenv()
 # Initialize Rich console for better terminal output
 console = Console()
 
+# Markdown code fences (with an optional html/xml/markdown tag) in tool output
+_MD_FENCE = re.compile(r'```(?:(?:html|xml|markdown)?\n)?')
+
+# Longest Playwright page content shown, plus slack for fences stripped from
+# it; output with many fences near the cut can still come out shorter
+_CONTENT_CHARS = 1000
+_CONTENT_FENCE_MARGIN = 16
+
+# Fixed summaries for Playwright operations whose raw output isn't useful,
+# keyed on a substring of the tool name and checked in order
+_PLAYWRIGHT_MESSAGES = {
+    "screenshot": "Screenshot captured successfully.",
+    "navigate": "Navigated to the requested page successfully.",
+    "goto": "Navigated to the requested page successfully.",
+    "click": "Clicked on the specified element.",
+}
+
+# How far history may grow past its configured limits before it is trimmed
+# back to them; trimming forces a chat session rebuild, so it is batched
+_HISTORY_HIGH_WATER = 1.25
+
+# Longest tool result kept in chat history; the full result is only sent once
+_HISTORY_TOOL_RESULT_CHARS = 1000
+
+def _truncate(text: str, limit: int, cut: bool = False) -> str:
+    """Cut text to at most limit characters, marking the cut with an ellipsis
+
+    Pass cut=True when the text was already shortened upstream, so the
+    ellipsis is added even if it now fits.
+    """
+    if not cut and len(text) <= limit:
+        return text
+    return text[:limit - 3] + "..."
+
+def _extract_tool_calls(text: str) -> List[str]:
+    """Extract JSON objects from ```json fenced blocks in a single linear scan"""
+    tool_calls = []
+    idx = text.find('```json')
+    while idx != -1:
+        body_start = idx + len('```json')
+        body_end = text.find('```', body_start)
+        if body_end == -1:
+            break
+        
+        body = text[body_start:body_end]
+        start = body.find('{')
+        if start != -1 and not body[:start].strip():
+            # Walk to the matching closing brace, ignoring braces inside strings
+            depth = 0
+            in_string = False
+            escaped = False
+            for pos in range(start, len(body)):
+                char = body[pos]
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == '\\':
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"':
+                    in_string = True
+                elif char == '{':
+                    depth += 1
+                elif char == '}':
+                    depth -= 1
+                    if depth == 0:
+                        tool_calls.append(body[start:pos + 1])
+                        break
+            else:
+                # Unbalanced object (e.g. truncated output); pass it on so the
+                # caller reports it as an invalid tool call
+                tool_calls.append(body[start:].rstrip())
+        
+        idx = text.find('```json', body_end + 3)
+    return tool_calls
+
+def _json_loads(data):
+    """Parse JSON, using orjson when it is available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dumps(obj, indent: bool = False) -> str:
+    """Serialize to a JSON string, using orjson when it is available"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None).decode()
+    if indent:
+        return json.dumps(obj, indent=2)
+    return json.dumps(obj, separators=(",", ":"))
+
+def _freeze(value):
+    """Recursively convert dicts to read-only mappings and lists to tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+# Configuration used when napier_config.json is missing or unreadable
+_DEFAULT_CONFIG: Mapping[str, Any] = _freeze({
+    "mcpServers": {},
+    "defaults": {},
+    "napier": {
+        "model": "gemini-2.0-flash",
+        "api_config": {"temperature": 0.2}
+    }
+})
+
+@lru_cache(maxsize=4)
+def _read_config_file(config_path: str, mtime: float) -> Mapping[str, Any]:
+    """Parse a config file, memoized on (path, mtime) so edits are still picked up
+
+    The result is shared between callers, so it is returned deeply frozen.
+    """
+    with open(config_path, 'rb') as f:
+        return _freeze(_json_loads(f.read()))
+
 class NapierConfig:
     """
     Class to handle Napier configuration from JSON file
@@ -41,36 +163,26 @@ class NapierConfig:
             config_path: Path to napier_config.json file (optional)
         """
         self.config_path = config_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'napier_config.json')
-        self.config = self._load_config()
         
-    def _load_config(self) -> Dict[str, Any]:
+    @property
+    def config(self) -> Mapping[str, Any]:
+        """Current configuration, re-read only when the file has changed"""
+        return self._load_config()
+        
+    def _load_config(self) -> Mapping[str, Any]:
         """Load configuration from JSON file"""
         try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r') as f:
-                    return json.load(f)
-            else:
-                console.print(f"[yellow]Config file not found at {self.config_path}. Using default configuration.[/yellow]")
-                return {
-                    "mcpServers": {},
-                    "defaults": {},
-                    "napier": {
-                        "model": "gemini-2.0-flash",
-                        "api_config": {"temperature": 0.2}
-                    }
-                }
+            # A single stat both checks for the file and keys the parse cache
+            mtime = os.stat(self.config_path).st_mtime
+            return _read_config_file(self.config_path, mtime)
+        except FileNotFoundError:
+            console.print(f"[yellow]Config file not found at {self.config_path}. Using default configuration.[/yellow]")
+            return _DEFAULT_CONFIG
         except Exception as e:
             console.print(f"[bold red]Error loading config: {str(e)}[/bold red]")
-            return {
-                "mcpServers": {},
-                "defaults": {},
-                "napier": {
-                    "model": "gemini-2.0-flash",
-                    "api_config": {"temperature": 0.2}
-                }
-            }
+            return _DEFAULT_CONFIG
     
-    def get_server_config(self, server_name: str) -> Optional[Dict[str, Any]]:
+    def get_server_config(self, server_name: str) -> Optional[Mapping[str, Any]]:
         """Get configuration for a specific MCP server"""
         servers = self.config.get("mcpServers", {})
         return servers.get(server_name)
@@ -79,32 +191,72 @@ class NapierConfig:
         """Get default MCP server name"""
         return self.config.get("defaults", {}).get("server")
     
-    def get_napier_config(self) -> Dict[str, Any]:
+    def get_napier_config(self) -> Mapping[str, Any]:
         """Get Napier-specific configuration"""
         return self.config.get("napier", {})
     
-    def list_servers(self) -> Dict[str, Dict[str, Any]]:
+    def list_servers(self) -> Mapping[str, Mapping[str, Any]]:
         """List all configured MCP servers"""
         return self.config.get("mcpServers", {})
 
 class ThinkingAnimation:
-    """Class to display a thinking animation while waiting for a response"""
+    """Class to display a thinking animation while waiting for a response
+    
+    A single instance is reused for the lifetime of the client. Nested
+    scopes only update the spinner text; the outermost one tears down the
+    live display on exit.
+    """
     def __init__(self, message="Thinking"):
         self.message = message
-        self.spinner = Spinner("dots", text=message)
-        self.live = Live(self.spinner, refresh_per_second=10)
-        self.running = False
-        self.thread = None
+        self.spinner = None
+        self.live = None
+        self._messages: List[str] = []
+        
+    async def __aenter__(self):
+        self.start()
+        return self
+        
+    async def __aexit__(self, *exc):
+        self.stop(self.message)
+        
+    @asynccontextmanager
+    async def show(self, message: str):
+        """Show a custom message for the duration of an `async with` block"""
+        self.start(message)
+        try:
+            yield self
+        finally:
+            self.stop(message)
+        
+    def start(self, message: Optional[str] = None):
+        """Start the thinking animation, or show a new message if already running"""
+        if self.live is None:
+            from rich.live import Live
+            from rich.spinner import Spinner
+            self.spinner = Spinner("dots", text=self.message)
+            self.live = Live(self.spinner, console=console, refresh_per_second=10, transient=True)
+        
+        self._messages.append(message or self.message)
+        self.spinner.update(text=self._messages[-1])
+        if len(self._messages) == 1:
+            self.live.start()
         
-    def start(self):
-        """Start the thinking animation"""
-        self.running = True
-        self.live.start()
+    def stop(self, message: Optional[str] = None):
+        """Stop the thinking animation, restoring the previous message if nested
         
-    def stop(self):
-        """Stop the thinking animation"""
-        self.running = False
-        self.live.stop()
+        Pass the message given to start() when several operations overlap, so
+        the right entry is removed regardless of completion order.
+        """
+        if not self._messages:
+            return
+        if message in self._messages:
+            self._messages.remove(message)
+        else:
+            self._messages.pop()
+        if self._messages:
+            self.spinner.update(text=self._messages[-1])
+        else:
+            self.live.stop()
 
 class NapierClient:
     """
@@ -113,8 +265,10 @@ class NapierClient:
     """
     def __init__(self):
         # Initialize session and client objects
-        self.session: Optional[ClientSession] = None
+        self.session: Optional["ClientSession"] = None
         self.exit_stack = AsyncExitStack()
+        self.config = NapierConfig()
+        self._thinking = ThinkingAnimation()
         
         # Initialize Gemini API
         api_key = os.getenv("GEMINI_API_KEY")
@@ -123,44 +277,86 @@ class NapierClient:
             console.print("[yellow]Please create a .env file with your GEMINI_API_KEY=[/yellow]")
             sys.exit(1)
         
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-pro')
+        self._api_key = api_key
+        self._model = None
+        self._model_instruction = None
+        
+        # Persistent Gemini chat session; rebuilt only on /reset, a system
+        # prompt change, or when history has been trimmed
+        self._chat = None
         
-        # Conversation history
-        self.chat_history = []
+        # Conversation history, bounded to the last N user/model turns
+        napier_config = self.config.get_napier_config()
+        self.history_turns = napier_config.get("history_turns", 16)
+        self.history_max_tokens = napier_config.get("history_max_tokens", 32000)
+        self.chat_history = deque()
         self.connected_server = None
         
+        # Tools of the connected server, cached on connect
+        self._tools = []
+        self._tools_session = None
+        self._tools_description = ""
+        self._tools_prompt = ""
+        
         # System prompt for Gemini
         self.system_prompt = """You are a helpful AI assistant in the Napier terminal application.
 You can help users with various tasks and answer questions.
 When you're connected to MCP servers, you can use tools to interact with third-party applications.
 Be concise, helpful, and friendly in your responses."""
     
+    def _get_model(self, system_instruction: str):
+        """Gemini model for the given system instruction, created on first use"""
+        if self._model is None or self._model_instruction != system_instruction:
+            import google.generativeai as genai
+            genai.configure(api_key=self._api_key)
+            self._model = genai.GenerativeModel('gemini-1.5-pro', system_instruction=system_instruction)
+            self._model_instruction = system_instruction
+        return self._model
+    
+    def _get_chat(self, system_instruction: str):
+        """Return the persistent chat session, rebuilding it only when needed
+        
+        The system prompt is sent once per session as a system instruction
+        rather than with every message. The session is rebuilt from
+        chat_history when the instruction changes or when history has been
+        trimmed, so it never holds more turns than chat_history does.
+        """
+        trimmed = self._trim_history()
+        if (trimmed
+                or self._chat is None
+                or self._model_instruction != system_instruction
+                or len(self._chat.history) != len(self.chat_history)):
+            model = self._get_model(system_instruction)
+            self._chat = model.start_chat(history=list(self.chat_history))
+        return self._chat
+    
+    def reset_chat(self):
+        """Clear the conversation history and start a fresh chat session"""
+        self.chat_history.clear()
+        self._chat = None
+    
     async def initialize_playwright(self):
         """Initialize Playwright with browser installation"""
         console.print("[yellow]Initializing Playwright and installing browsers...[/yellow]")
         
-        # Create a thinking animation
-        thinking = ThinkingAnimation("Installing Playwright browsers")
-        thinking.start()
-        
         try:
-            # Run the browser installation command
-            result = subprocess.run(
-                ["playwright", "install", "chromium"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            thinking.stop()
+            # Run the browser installation command without blocking the event loop;
+            # download progress on stdout is discarded rather than buffered
+            async with self._thinking.show("Installing Playwright browsers"):
+                proc = await asyncio.create_subprocess_exec(
+                    "playwright", "install", "chromium",
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                _, stderr = await proc.communicate()
+            
+            if proc.returncode != 0:
+                console.print(f"[bold red]Error installing Playwright browsers: {stderr.decode(errors='replace')}[/bold red]")
+                return False
+            
             console.print("[green]Successfully installed Playwright browsers![/green]")
             return True
-        except subprocess.CalledProcessError as e:
-            thinking.stop()
-            console.print(f"[bold red]Error installing Playwright browsers: {e.stderr}[/bold red]")
-            return False
         except Exception as e:
-            thinking.stop()
             console.print(f"[bold red]Error during Playwright initialization: {str(e)}[/bold red]")
             return False
     
@@ -179,6 +375,7 @@ Be concise, helpful, and friendly in your responses."""
             raise ValueError("Server script must be a .py or .js file")
 
         command = "python" if is_python else "node"
+        from mcp import StdioServerParameters
         server_params = StdioServerParameters(
             command=command,          # Python or Node interpreter
             args=[server_script_path], # Path to server script
@@ -187,6 +384,8 @@ Be concise, helpful, and friendly in your responses."""
 
         try:
             console.print(f"[yellow]Connecting to MCP server: {server_script_path}...[/yellow]")
+            from mcp import ClientSession
+            from mcp.client.stdio import stdio_client
             stdio_transport = await self.exit_stack.enter_async_context(stdio_client(server_params))
             self.stdio, self.write = stdio_transport
             self.session = await self.exit_stack.enter_async_context(ClientSession(self.stdio, self.write))
@@ -198,6 +397,7 @@ Be concise, helpful, and friendly in your responses."""
             response = await self.session.list_tools()
             tools = response.tools
             tool_names = [tool.name for tool in tools]
+            self._cache_tools(tools)
             
             console.print(f"[green]Successfully connected to server![/green]")
             console.print(Panel(
@@ -217,16 +417,17 @@ Be concise, helpful, and friendly in your responses."""
         Args:
             server_name: Name of the server in the mcpServers config section
         """
-        config = NapierConfig()
-        server_config = config.get_server_config(server_name)
+        server_config = self.config.get_server_config(server_name)
         
         if not server_config:
             console.print(f"[bold red]Error: Server '{server_name}' not found in configuration.[/bold red]")
             return None
         
         command = server_config.get("command")
-        args = server_config.get("args", [])
+        # The config is read-only; hand the server plain, private copies
+        args = list(server_config.get("args", []))
         env = server_config.get("env")
+        env = dict(env) if env is not None else None
         
         # Store the server name
         self.connected_server = server_name
@@ -257,6 +458,7 @@ Be concise, helpful, and friendly in your responses."""
             response = await self.session.list_tools()
             tools = response.tools
             tool_names = [tool.name for tool in tools]
+            self._cache_tools(tools)
             
             console.print(f"[green]Successfully connected to server: {server_name}![/green]")
             console.print(Panel(
@@ -274,30 +476,60 @@ Be concise, helpful, and friendly in your responses."""
             console.print(f"[bold red]Error connecting to server: {str(e)}[/bold red]")
             return None
     
-    async def process_query(self, query: str) -> str:
-        """Process a query using Gemini and available tools"""
-        if not self.session:
-            return "Error: Not connected to any MCP server. Use 'connect' command first."
+    def _trim_history(self) -> bool:
+        """Trim history once it overshoots its limits; returns True if anything was dropped
+        
+        Trimming starts only when the turn cap or the approximate token budget
+        is exceeded by _HISTORY_HIGH_WATER, and then drops the oldest entries
+        until history is back within the configured limits. The chat session
+        is therefore rebuilt occasionally rather than on every turn, and never
+        keeps less than the user configured.
+        """
+        max_entries = 2 * self.history_turns
+        # Assume roughly 4 characters per token
+        max_chars = 4 * self.history_max_tokens
+        total = sum(len(part) for entry in self.chat_history for part in entry["parts"])
+        if (len(self.chat_history) <= max_entries * _HISTORY_HIGH_WATER
+                and total <= max_chars * _HISTORY_HIGH_WATER):
+            return False
+        
+        while self.chat_history and (len(self.chat_history) > max_entries or total > max_chars):
+            entry = self.chat_history.popleft()
+            total -= sum(len(part) for part in entry["parts"])
         
-        # Add user query to history
-        self.chat_history.append({"role": "user", "parts": [query]})
+        # Keep the history starting on a user turn
+        while self.chat_history and self.chat_history[0]["role"] != "user":
+            self.chat_history.popleft()
+        return True
+    
+    def _cache_tools(self, tools):
+        """Cache the server's tools and their formatted description for prompts"""
+        self._tools = tools
+        self._tools_session = self.session
+        self._tools_description = self._build_tools_description(tools)
+        self._tools_prompt = self._build_tools_prompt(self._tools_description)
+    
+    def _build_tools_description(self, tools) -> str:
+        """Format tools and their input schemas for the Gemini prompt"""
+        parts = ["You have access to the following tools:\n"]
+        for tool in tools:
+            parts.append(f"- {tool.name}: {tool.description}")
+            # Compact JSON: the model reads it just as well and it costs fewer tokens
+            parts.append("  Input schema: " + _json_dumps(tool.inputSchema) + "\n")
+        return "\n".join(parts)
+    
+    async def refresh_tools(self):
+        """Re-fetch the tool list from the connected MCP server"""
+        if not self.session:
+            return None
         
-        # Get available tools from the server
         response = await self.session.list_tools()
-        available_tools = [{
-            "name": tool.name,
-            "description": tool.description,
-            "input_schema": tool.inputSchema
-        } for tool in response.tools]
-        
-        # Format tools for Gemini
-        tools_description = "You have access to the following tools:\n\n"
-        for tool in available_tools:
-            tools_description += f"- {tool['name']}: {tool['description']}\n"
-            tools_description += f"  Input schema: {json.dumps(tool['input_schema'], indent=2)}\n\n"
-        
-        # Prepare prompt with instructions and tools
-        system_prompt = f"""You are an AI assistant that helps users interact with various applications through tools.
+        self._cache_tools(response.tools)
+        return [tool.name for tool in self._tools]
+    
+    def _build_tools_prompt(self, tools_description: str) -> str:
+        """Build the system instruction used while connected to an MCP server"""
+        return f"""You are an AI assistant that helps users interact with various applications through tools.
 {tools_description}
 
 INSTRUCTIONS:
@@ -318,149 +550,171 @@ INSTRUCTIONS:
 6. If no tool is needed, respond directly to the user's request.
 
 Always make sure to follow the exact input schema for each tool when making a call."""
-
-        # Create and start thinking animation
-        thinking = ThinkingAnimation()
-        thinking.start()
+    
+    async def process_query(self, query: str) -> str:
+        """Process a query using Gemini and available tools"""
+        if not self.session:
+            return "Error: Not connected to any MCP server. Use 'connect' command first."
+        
+        # Only hit the server if the cached tools belong to a previous session
+        if self._tools_session is not self.session:
+            await self.refresh_tools()
         
         try:
-            # Initialize Gemini chat
-            chat = self.model.start_chat(history=self.chat_history)
+            async with self._thinking:
+                chat = self._get_chat(self._tools_prompt)
+                
+                # The tools prompt is the chat's system instruction, so only the query is sent
+                response = await chat.send_message_async(
+                    query,
+                    generation_config={"temperature": 0.2}
+                )
+                
+                response_text = response.text
+                self.chat_history.append({"role": "user", "parts": [query]})
+                self.chat_history.append({"role": "model", "parts": [response_text]})
+                
+                # Process tool calls in response
+                tool_calls = _extract_tool_calls(response_text)
+                
+                if not tool_calls:
+                    # No tool calls, just return the response
+                    return response_text
+                
+                # Each tool's follow-up message overlaps with the next tool's execution
+                tool_lock = asyncio.Lock()
+                send_lock = asyncio.Lock()
+                results = await asyncio.gather(*(
+                    self._run_one_tool(chat, tool_call_json, tool_lock, send_lock)
+                    for tool_call_json in tool_calls
+                ))
             
-            # Send the query along with system prompt
-            response = chat.send_message(
-                [system_prompt, query],
-                generation_config={"temperature": 0.2}
-            )
+            final_response = []
+            for result in results:
+                final_response.extend(result)
+            return "\n".join(final_response)
+                
+        except Exception as e:
+            console.print(f"[bold red]Error: {str(e)}[/bold red]")
+            return f"Error processing query: {str(e)}"
+    
+    async def _run_one_tool(self, chat, tool_call_json: str, tool_lock: asyncio.Lock, send_lock: asyncio.Lock) -> List[str]:
+        """Execute a single tool call and send its result back to Gemini
+        
+        Tool calls are serialized through tool_lock in the order the model
+        listed them, since later calls may depend on earlier ones (e.g. navigate then
+        click). Follow-ups are serialized through send_lock because the chat
+        session is not safe for concurrent sends. Returns the response parts
+        for this tool call, in display order.
+        """
+        try:
+            tool_call = _json_loads(tool_call_json)
+            tool_name = tool_call.get("tool_name")
+            parameters = tool_call.get("parameters", {})
             
-            response_text = response.text
-            self.chat_history.append({"role": "model", "parts": [response_text]})
+            # Execute tool call
+            async with tool_lock:
+                console.print(f"[bold cyan]Executing tool:[/bold cyan] {tool_name}")
+                console.print(f"[cyan]Parameters:[/cyan] {_json_dumps(parameters, indent=True)}")
+                
+                async with self._thinking.show(f"Executing {tool_name}"):
+                    # Re-fetch once if the model names a tool we haven't seen
+                    if tool_name not in (tool.name for tool in self._tools):
+                        await self.refresh_tools()
+                    result = await self.session.call_tool(tool_name, parameters)
             
-            # Process tool calls in response
-            import re
-            tool_call_pattern = r"```json\s*(\{[^`]*\})\s*```"
-            tool_calls = re.findall(tool_call_pattern, response_text)
+            # Clean up the tool result, especially for Playwright
+            result_content = self._clean_tool_output(tool_name, result.content)
             
-            final_response = []
+            # Format tool result for display
+            result_str = f"\n[Tool Result]\n{result_content}\n"
             
-            if tool_calls:
-                for tool_call_json in tool_calls:
-                    try:
-                        tool_call = json.loads(tool_call_json)
-                        tool_name = tool_call.get("tool_name")
-                        parameters = tool_call.get("parameters", {})
-                        
-                        thinking.stop()  # Stop thinking animation to show tool execution
-                        console.print(f"[bold cyan]Executing tool:[/bold cyan] {tool_name}")
-                        console.print(f"[cyan]Parameters:[/cyan] {json.dumps(parameters, indent=2)}")
-                        
-                        # Start thinking animation for tool execution
-                        tool_thinking = ThinkingAnimation(f"Executing {tool_name}")
-                        tool_thinking.start()
-                        
-                        # Execute tool call
-                        result = await self.session.call_tool(tool_name, parameters)
-                        tool_thinking.stop()
-                        
-                        # Clean up the tool result, especially for Playwright
-                        result_content = self._clean_tool_output(tool_name, result.content)
-                        
-                        # Format tool result for display
-                        result_str = f"\n[Tool Result]\n{result_content}\n"
-                        final_response.append(result_str)
-                        
-                        # Send tool result back to Gemini
-                        thinking.start()  # Restart thinking animation for follow-up
-                        followup_system_prompt = f"""The tool '{tool_name}' returned the following result:
-
-{result.content}
+            # Send the full tool result back to Gemini
+            followup_system_prompt = self._tool_result_prompt(tool_name, str(result.content))
+            
+            # History keeps a truncated copy so large results aren't re-sent on later turns
+            history_prompt = self._tool_result_prompt(
+                tool_name, _truncate(str(result.content), _HISTORY_TOOL_RESULT_CHARS)
+            )
+            
+            async with send_lock:
+                followup_response = await chat.send_message_async(followup_system_prompt)
+                # Swap the full result the session just recorded for the truncated copy
+                chat.history[-2].parts[0].text = history_prompt
+                self.chat_history.append({"role": "user", "parts": [history_prompt]})
+                self.chat_history.append({"role": "model", "parts": [followup_response.text]})
+            
+            return [result_str, followup_response.text]
+            
+        except json.JSONDecodeError:
+            console.print(f"[bold red]Error: Invalid JSON format in tool call[/bold red]")
+            return ["Error: Invalid tool call format detected."]
+        except Exception as e:
+            console.print(f"[bold red]Error executing tool: {str(e)}[/bold red]")
+            return [f"Error executing tool: {str(e)}"]
+    
+    def _tool_result_prompt(self, tool_name: str, content: str) -> str:
+        """Build the follow-up message that hands a tool result back to Gemini"""
+        return f"""The tool '{tool_name}' returned the following result:
+
+{content}
 
 Please analyze this result and provide a helpful response to the user based on this information.
 Keep your response focused on the insights from the tool result."""
-
-                        followup_response = chat.send_message(followup_system_prompt)
-                        final_response.append(followup_response.text)
-                        self.chat_history.append({"role": "model", "parts": [followup_response.text]})
-                        
-                    except json.JSONDecodeError:
-                        console.print(f"[bold red]Error: Invalid JSON format in tool call[/bold red]")
-                        final_response.append("Error: Invalid tool call format detected.")
-                    except Exception as e:
-                        console.print(f"[bold red]Error executing tool: {str(e)}[/bold red]")
-                        final_response.append(f"Error executing tool: {str(e)}")
-                
-                thinking.stop()  # Stop thinking animation before final response
-                return "\n".join(final_response)
-            else:
-                # No tool calls, just return the response
-                thinking.stop()  # Stop thinking animation
-                return response_text
-                
-        except Exception as e:
-            thinking.stop()  # Make sure to stop animation on error
-            console.print(f"[bold red]Error: {str(e)}[/bold red]")
-            return f"Error processing query: {str(e)}"
     
     def _clean_tool_output(self, tool_name: str, output: str) -> str:
         """Clean and format tool output for better display"""
-        if "playwright" in tool_name.lower():
-            # Try to extract the most relevant information from Playwright output
-            import re
-            
-            # Remove noisy HTML, XML, or markdown tags
-            output = re.sub(r'```(?:html|xml|markdown|)\n', '', output)
-            output = re.sub(r'```', '', output)
-            
-            # Try to extract useful content from Playwright operations
-            if "screenshot" in tool_name.lower():
-                return "Screenshot captured successfully."
-                
-            if "navigate" in tool_name.lower() or "goto" in tool_name.lower():
-                return f"Navigated to the requested page successfully."
-                
-            if "click" in tool_name.lower():
-                return "Clicked on the specified element."
-                
-            if "get" in tool_name.lower() and "content" in tool_name.lower():
-                # For content extraction, try to keep it clean but informative
-                # Remove any leading/trailing whitespace and limit length
-                output = output.strip()
-                if len(output) > 1000:
-                    output = output[:997] + "..."
-                
-            # For other Playwright operations, provide a generic clean response
-            if len(output.strip()) == 0:
-                return "Operation completed successfully."
+        lname = tool_name.lower()
+        if "playwright" not in lname:
+            return output
+        
+        # Try to extract useful content from Playwright operations
+        for key, message in _PLAYWRIGHT_MESSAGES.items():
+            if key in lname:
+                return message
+        
+        is_content = "get" in lname and "content" in lname
+        cut = False
+        if is_content:
+            # For content extraction, bound the regex scan with a small margin
+            # so fences near the cut are still removed whole. Leading
+            # whitespace is dropped first so it doesn't use up the budget.
+            output = output.lstrip()
+            bound = _CONTENT_CHARS + _CONTENT_FENCE_MARGIN
+            cut = len(output) > bound
+            output = output[:bound]
+        
+        # Remove noisy HTML, XML, or markdown fences in a single pass, then
+        # any leading/trailing whitespace
+        output = _MD_FENCE.sub('', output).strip()
+        
+        if is_content:
+            output = _truncate(output, _CONTENT_CHARS, cut)
+        
+        # For other Playwright operations, provide a generic clean response
+        if not output:
+            return "Operation completed successfully."
         
         return output
 
     async def chat_with_gemini(self, query: str) -> str:
         """Chat directly with Gemini without using MCP tools"""
-        # Add user query to history
-        self.chat_history.append({"role": "user", "parts": [query]})
-        
-        # Create and start thinking animation
-        thinking = ThinkingAnimation()
-        thinking.start()
-        
         try:
-            # Initialize Gemini chat with system prompt
-            chat = self.model.start_chat(history=self.chat_history)
-            
-            # Send the query with system prompt
-            response = chat.send_message(
-                [self.system_prompt, query],
-                generation_config={"temperature": 0.7}
-            )
+            async with self._thinking:
+                chat = self._get_chat(self.system_prompt)
+                
+                # The system prompt is the chat's system instruction, so only the query is sent
+                response = await chat.send_message_async(
+                    query,
+                    generation_config={"temperature": 0.7}
+                )
             
             response_text = response.text
+            self.chat_history.append({"role": "user", "parts": [query]})
             self.chat_history.append({"role": "model", "parts": [response_text]})
-            
-            thinking.stop()  # Stop thinking animation
             return response_text
                 
         except Exception as e:
-            thinking.stop()  # Make sure to stop animation on error
             console.print(f"[bold red]Error: {str(e)}[/bold red]")
             return f"Error: {str(e)}"
             
@@ -469,11 +723,11 @@ Keep your response focused on the insights from the tool result."""
         if not self.session:
             return "Not connected to any MCP server. Use '/connect <path_to_server>' first."
             
-        response = await self.session.list_tools()
-        tools = response.tools
+        if self._tools_session is not self.session:
+            await self.refresh_tools()
         
         result = "Available MCP Tools:\n\n"
-        for tool in tools:
+        for tool in self._tools:
             result += f"• {tool.name}: {tool.description}\n"
             
         return result
@@ -491,6 +745,8 @@ Keep your response focused on the insights from the tool result."""
         • '/connect-server <server_name>' - Connect to a configured MCP server
         • '/servers' - List configured MCP servers
         • '/tools' - List available MCP tools
+        • '/refresh-tools' - Reload tools from the connected MCP server
+        • '/reset' - Clear the conversation history
         • '/help' - Show help information
         • '/exit' or '/quit' - Exit the application
         
@@ -498,6 +754,19 @@ Keep your response focused on the insights from the tool result."""
         """
         console.print(Panel(welcome_message, border_style="blue"))
 
+        commands = {
+            '/exit': self._cmd_exit,
+            '/quit': self._cmd_exit,
+            '/connect': self._cmd_connect,
+            '/connect-server': self._cmd_connect_server,
+            '/servers': self._cmd_servers,
+            '/tools': self._cmd_tools,
+            '/refresh-tools': self._cmd_refresh_tools,
+            '/reset': self._cmd_reset,
+            '/help': self._cmd_help,
+            '/use': self._cmd_use,
+        }
+
         while True:
             try:
                 if self.connected_server:
@@ -505,90 +774,124 @@ Keep your response focused on the insights from the tool result."""
                 else:
                     prompt = "[bold blue]Napier[/bold blue] > "
                     
-                user_input = Prompt.ask(prompt)
-                
-                if user_input.lower() in ['/exit', '/quit']:
-                    console.print("[yellow]Exiting Napier...[/yellow]")
-                    break
+                user_input = Prompt.ask(prompt).strip()
+                if not user_input:
+                    continue
                 
-                elif user_input.lower().startswith('/connect '):
-                    server_path = user_input[9:].strip()
-                    await self.connect_to_server(server_path)
+                if user_input.startswith('/'):
+                    # Parse the command once and dispatch on its lowercased name
+                    cmd, _, rest = user_input.partition(' ')
+                    handler = commands.get(cmd.lower())
+                    if handler is None:
+                        console.print("[bold yellow]Unknown command. Type '/help' for assistance.[/bold yellow]")
+                    elif await handler(rest.strip()):
+                        break
+                    continue
                 
-                elif user_input.lower().startswith('/connect-server '):
-                    server_name = user_input[16:].strip()
-                    await self.connect_to_server_from_config(server_name)
-                    
-                elif user_input.lower() == '/servers':
-                    config = NapierConfig()
-                    servers = config.list_servers()
-                    
-                    if not servers:
-                        console.print("[yellow]No MCP servers configured. Add servers to napier_config.json.[/yellow]")
-                    else:
-                        servers_info = "Configured MCP Servers:\n\n"
-                        for name, cfg in servers.items():
-                            command = cfg.get("command", "N/A")
-                            args = " ".join(cfg.get("args", []))
-                            servers_info += f"• {name}: {command} {args}\n"
-                        
-                        console.print(Panel(servers_info, title="MCP Servers", border_style="green"))
-                    
-                elif user_input.lower() == '/tools':
-                    tools_info = await self.list_tools()
-                    console.print(Panel(tools_info, title="Available Tools", border_style="green"))
-                    
-                elif user_input.lower() == '/help':
-                    help_text = """
-                    Available commands:
-                    • '/connect <path_to_server>' - Connect to an MCP server
-                    • '/connect-server <server_name>' - Connect to a configured MCP server
-                    • '/servers' - List configured MCP servers
-                    • '/tools' - List available MCP tools
-                    • '/help' - Display this help message
-                    • '/exit' or '/quit' - Exit the application
+                # Check if connected to MCP server and use it if available
+                if self.session:
+                    response = await self.process_query(user_input)
+                else:
+                    # Direct chat with Gemini
+                    response = await self.chat_with_gemini(user_input)
                     
-                    Chat directly with Napier or use MCP tools when connected
-                    • Type normally to chat with Napier
-                    • Type '/use <tool_name>' to specifically use an MCP tool
-                    """
-                    console.print(Panel(help_text, title="Napier Help", border_style="green"))
-                    
-                elif user_input.lower().startswith('/use ') and user_input.strip() != '/use':
-                    if not self.session:
-                        console.print("[bold yellow]Not connected to any MCP server. Use '/connect <path_to_server>' first.[/bold yellow]")
-                        continue
-                        
-                    # Extract tool name and query
-                    parts = user_input[5:].strip().split(' ', 1)
-                    if len(parts) < 2:
-                        console.print("[bold yellow]Please provide a query to use with the tool.[/bold yellow]")
-                        continue
-                        
-                    tool_name = parts[0]
-                    query = f"I want to use the '{tool_name}' tool to {parts[1]}"
-                        
-                    response = await self.process_query(query)
-                    # Print the response directly without a panel
-                    console.print(Markdown(response))
-                
-                elif user_input.strip() and user_input.startswith('/'):
-                    console.print("[bold yellow]Unknown command. Type '/help' for assistance.[/bold yellow]")
-                
-                elif user_input.strip():
-                    # Check if connected to MCP server and use it if available
-                    if self.session:
-                        response = await self.process_query(user_input)
-                    else:
-                        # Direct chat with Gemini
-                        response = await self.chat_with_gemini(user_input)
-                        
-                    # Print the response directly without a panel
-                    console.print(Markdown(response))
+                # Print the response directly without a panel
+                from rich.markdown import Markdown
+                console.print(Markdown(response))
                     
             except Exception as e:
                 console.print(f"[bold red]Error: {str(e)}[/bold red]")
 
+    async def _cmd_exit(self, rest: str) -> bool:
+        """Handle '/exit' and '/quit'; returns True to leave the chat loop"""
+        console.print("[yellow]Exiting Napier...[/yellow]")
+        return True
+
+    async def _cmd_connect(self, rest: str):
+        """Handle '/connect <path_to_server>'"""
+        if not rest:
+            console.print("[bold yellow]Usage: /connect <path_to_server>[/bold yellow]")
+            return
+        await self.connect_to_server(rest)
+
+    async def _cmd_connect_server(self, rest: str):
+        """Handle '/connect-server <server_name>'"""
+        if not rest:
+            console.print("[bold yellow]Usage: /connect-server <server_name>[/bold yellow]")
+            return
+        await self.connect_to_server_from_config(rest)
+
+    async def _cmd_servers(self, rest: str):
+        """Handle '/servers'"""
+        servers = self.config.list_servers()
+        
+        if not servers:
+            console.print("[yellow]No MCP servers configured. Add servers to napier_config.json.[/yellow]")
+        else:
+            servers_info = "Configured MCP Servers:\n\n"
+            for name, cfg in servers.items():
+                command = cfg.get("command", "N/A")
+                args = " ".join(cfg.get("args", []))
+                servers_info += f"• {name}: {command} {args}\n"
+            
+            console.print(Panel(servers_info, title="MCP Servers", border_style="green"))
+
+    async def _cmd_tools(self, rest: str):
+        """Handle '/tools'"""
+        tools_info = await self.list_tools()
+        console.print(Panel(tools_info, title="Available Tools", border_style="green"))
+
+    async def _cmd_refresh_tools(self, rest: str):
+        """Handle '/refresh-tools'"""
+        tool_names = await self.refresh_tools()
+        if tool_names is None:
+            console.print("[bold yellow]Not connected to any MCP server. Use '/connect <path_to_server>' first.[/bold yellow]")
+        else:
+            console.print(f"[green]Refreshed {len(tool_names)} tools from {self.connected_server}.[/green]")
+
+    async def _cmd_reset(self, rest: str):
+        """Handle '/reset'"""
+        self.reset_chat()
+        console.print("[green]Conversation history cleared.[/green]")
+
+    async def _cmd_help(self, rest: str):
+        """Handle '/help'"""
+        help_text = """
+        Available commands:
+        • '/connect <path_to_server>' - Connect to an MCP server
+        • '/connect-server <server_name>' - Connect to a configured MCP server
+        • '/servers' - List configured MCP servers
+        • '/tools' - List available MCP tools
+        • '/refresh-tools' - Reload tools from the connected MCP server
+        • '/reset' - Clear the conversation history
+        • '/help' - Display this help message
+        • '/exit' or '/quit' - Exit the application
+        
+        Chat directly with Napier or use MCP tools when connected
+        • Type normally to chat with Napier
+        • Type '/use <tool_name>' to specifically use an MCP tool
+        """
+        console.print(Panel(help_text, title="Napier Help", border_style="green"))
+
+    async def _cmd_use(self, rest: str):
+        """Handle '/use <tool_name> <query>'"""
+        if not self.session:
+            console.print("[bold yellow]Not connected to any MCP server. Use '/connect <path_to_server>' first.[/bold yellow]")
+            return
+            
+        # Extract tool name and query
+        tool_name, _, tool_query = rest.partition(' ')
+        if not tool_query.strip():
+            console.print("[bold yellow]Please provide a query to use with the tool.[/bold yellow]")
+            return
+            
+        query = f"I want to use the '{tool_name}' tool to {tool_query.strip()}"
+            
+        response = await self.process_query(query)
+        # Print the response directly without a panel
+        from rich.markdown import Markdown
+        console.print(Markdown(response))
+
     async def cleanup(self):
         """Clean up resources"""
         await self.exit_stack.aclose()